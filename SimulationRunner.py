@@ -1,55 +1,135 @@
 import subprocess
 import os
 import sys
-import xml.etree.ElementTree as ET
-import urllib.request
-import glob 
+
+try:
+    # lxml's libxml2-backed parser is substantially faster and leaner on the
+    # large .rou.xml/tripinfo files this script chews through.
+    from lxml import etree as ET
+    XMLParseError = ET.XMLSyntaxError
+except ImportError:
+    import xml.etree.ElementTree as ET
+    XMLParseError = ET.ParseError
+try:
+    # Optional: moves the tripinfo metric reductions into C-level loops.
+    import numpy as np
+except ImportError:
+    np = None
+
+import gzip
+import hashlib
+import http.client
+import shutil
+import time
+import xml.sax
+from array import array
+from functools import lru_cache
+from pathlib import Path
 from typing import List, Dict, Tuple, Optional, Any
-from collections import Counter
-import re
-import platform 
+from collections import Counter, defaultdict, deque
+import threading
+import platform
 
 # --- Global Configuration & Constants ---
-LOG_BASE_DIR = "scenario_logs" 
-SUMO_BINARY = "sumo" 
+LOG_BASE_DIR = "scenario_logs"
+SUMO_BINARY = "sumo"
+
+# Downloaded Overpass responses are kept here keyed by query hash, so two
+# runs over the same bounding box never hit the (rate-limited) API twice.
+OSM_CACHE_DIR = ".osm_cache"
+
+# Overpass endpoint and retry policy: the public instance throttles hard, so
+# requests back off exponentially on the usual rate-limit/gateway statuses.
+OVERPASS_HOST = "overpass-api.de"
+OVERPASS_PATH = "/api/interpreter"
+OVERPASS_MAX_RETRIES = 3
+OVERPASS_RETRY_STATUSES = (429, 502, 503, 504)
+
+# SUMO installation paths, probed once at import instead of re-deriving them
+# (and re-checking the environment) on every call.
+SUMO_HOME = os.environ.get('SUMO_HOME')
+SUMO_TOOLS = os.path.join(SUMO_HOME, 'tools') if SUMO_HOME else None
+RANDOMTRIPS_SCRIPT = os.path.join(SUMO_TOOLS, 'randomTrips.py') if SUMO_TOOLS else None
+
+# The polyconvert typemap may live in the install tree or a platform data
+# dir; the first candidate that actually exists wins, and polyconvert is
+# refused outright (instead of being handed a bogus path) when none do.
+TYPEMAP_PATH = next(
+    (p for p in [
+        os.path.join(SUMO_HOME, 'data', 'typemap', 'osmPolyconvert.typ.xml') if SUMO_HOME else '',
+        '/usr/share/sumo/data/typemap/osmPolyconvert.typ.xml',
+        'C:/Program Files (x86)/Eclipse/Sumo/data/typemap/osmPolyconvert.typ.xml',
+    ] if p and os.path.exists(p)),
+    None
+)
+
+# Make the TraCI/sumolib tools importable right away.
+if SUMO_TOOLS and SUMO_TOOLS not in sys.path:
+    sys.path.append(SUMO_TOOLS)
 
 # Consistent Simulation Parameters
 REROUTING_PERIOD = "600"
 MAX_DEPART_DELAY = "10000"
 
+# randomTrips' --validate re-routes every generated trip up front, which is
+# often the dominant cost of trip generation; duarouter --ignore-errors
+# already filters infeasible trips downstream, so the pre-check is opt-in.
+VALIDATE_TRIPS = os.environ.get('VALIDATE_TRIPS', '0') == '1'
+
+# How often (in simulated seconds) Mode 3 polls vehicle positions inside the
+# blocking window; between scripted events the simulation advances in C++.
+MODE3_POLL_INTERVAL = 5
+
 # --- SUMO Vehicle Class Definitions (Authoritative List from Documentation) ---
 
-# This list is the definitive set of all predefined vehicle classes in SUMO.
-SUMO_AUTHORITATIVE_VCLASSES = [
+# This is the definitive set of all predefined vehicle classes in SUMO.
+# The groups are immutable tuples: they are passed straight to
+# traci.lane.setAllowed, so they are allocated exactly once and can never be
+# mutated by accident between the block and unblock calls.
+SUMO_AUTHORITATIVE_VCLASSES = (
     "ignoring", "private", "emergency", "authority", "army", "vip",
     "pedestrian", "passenger", "hov", "taxi", "bus", "coach",
     "delivery", "truck", "trailer", "motorcycle", "moped", "bicycle",
     "evehicle", "tram", "rail_urban", "rail", "rail_electric", "rail_fast",
     "ship", "custom1", "custom2"
-]
+)
 
 # Groupings used for TraCI control logic (blocking)
-EMERGENCY_VCLASSES = ['emergency', 'authority', 'army'] # Vehicles typically granted priority access
+EMERGENCY_VCLASSES = ('emergency', 'authority', 'army') # Vehicles typically granted priority access
 ALL_VCLASSES_TO_CONTROL = SUMO_AUTHORITATIVE_VCLASSES
 
 # Allowed classes when we only want to block 'emergency' (Mode 2)
-# This list includes ALL standard classes except the defined EMERGENCY ones.
-ALLOWED_FOR_PASSENGER = [v for v in ALL_VCLASSES_TO_CONTROL if v not in EMERGENCY_VCLASSES]
+# This group includes ALL standard classes except the defined EMERGENCY ones.
+ALLOWED_FOR_PASSENGER = tuple(v for v in ALL_VCLASSES_TO_CONTROL if v not in EMERGENCY_VCLASSES)
+
+# Sentinel lane filter for edges that are not blocked at all (Mode 3 lookup).
+_NOT_BLOCKED = frozenset()
 
 
 def find_sumo_and_add_path():
-    """Checks if $SUMO_HOME is set and adds the tools directory to sys.path."""
-    if 'SUMO_HOME' in os.environ:
-        # print("✅ SUMO_HOME found and 'tools' path added to sys.path.")
-        tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
-        if tools not in sys.path:
-            sys.path.append(tools)
+    """Checks that $SUMO_HOME was set (the tools dir is added to sys.path at import)."""
+    if SUMO_HOME:
         return True
     else:
         print("⚠️ SUMO_HOME environment variable not set.")
         print("Please ensure SUMO is installed and added to your system PATH.")
         return False
 
+def _find_osm_files(max_hits: int = 2) -> List[str]:
+    """
+    Probes the working directory for .osm files, stopping after max_hits:
+    the caller only distinguishes none / exactly one / several, so there is
+    no point statting every entry of a large directory.
+    """
+    hits = []
+    with os.scandir('.') as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith('.osm'):
+                hits.append(entry.name)
+                if len(hits) >= max_hits:
+                    break
+    return hits
+
 def get_user_inputs():
     """
     Gathers user inputs for the map, trip configuration, and dynamic blocking mode.
@@ -58,7 +138,7 @@ def get_user_inputs():
     print("NOTE: You must have a working SUMO installation to run this.")
     
     # 1. Map/Filename Detection/Input
-    osm_files = glob.glob("*.osm")
+    osm_files = _find_osm_files()
     default_filename = "LosAngeles" 
     dc_min_lat, dc_min_lon, dc_max_lat, dc_max_lon = "34.0500", "-118.2500", "34.0600", "-118.2400"
     bbox = (dc_min_lat, dc_min_lon, dc_max_lat, dc_max_lon)
@@ -75,7 +155,7 @@ def get_user_inputs():
         if len(osm_files) == 0:
             print("⚠️ No existing .osm files found. Proceeding with manual download via BBOX.")
         else:
-            print(f"⚠️ Found {len(osm_files)} .osm files. Cannot auto-select. Proceeding with manual BBOX/filename input.")
+            print(f"⚠️ Found several .osm files. Cannot auto-select. Proceeding with manual BBOX/filename input.")
             
         min_lat = input(f"Enter Minimum Latitude (min_lat) [Default: {dc_min_lat} (LA)]: ") or dc_min_lat
         min_lon = input(f"Enter Minimum Longitude (lon) [Default: {dc_min_lon} (LA)]: ") or dc_min_lon
@@ -112,38 +192,134 @@ def get_user_inputs():
     
     return filename, bbox, end_time_int, period, blocking_mode_int, specific_ids_str
 
-def run_command(command: List[str], description: str) -> bool:
-    """Executes a command and checks for success."""
+# How many trailing stderr lines run_command keeps for failure diagnosis.
+STDERR_TAIL_LINES = 200
+
+def _drain_to_tail(stream, tail: deque):
+    """Consumes a subprocess stream line by line into a bounded deque."""
+    for line in stream:
+        tail.append(line.rstrip('\n'))
+    stream.close()
+
+def _start_command(command: List[str]):
+    """
+    Launches a command with stdout discarded and stderr drained into a
+    bounded ring buffer. Returns an opaque handle for _finish_command, or
+    None if the binary is missing. Splitting launch from wait lets
+    independent preprocessing tools run concurrently.
+    """
     print(f"\n▶️ Running: {' '.join(command)}")
     try:
-        # Suppress output unless it fails, for cleaner logs
-        result = subprocess.run(
+        process = subprocess.Popen(
             command,
-            check=True,
-            capture_output=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
             text=True
         )
-        print("✅ Finished successfully.")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Error during {description}.")
-        print(f"STDOUT: {e.stdout}")
-        print(f"STDERR: {e.stderr}")
-        return False
     except FileNotFoundError:
         print(f"❌ Error: Command not found. Ensure '{command[0]}' is in your system PATH.")
+        return None
+
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+    reader = threading.Thread(target=_drain_to_tail, args=(process.stderr, stderr_tail), daemon=True)
+    reader.start()
+    return process, stderr_tail, reader
+
+def _finish_command(handle, description: str) -> bool:
+    """Waits for a _start_command handle and reports success or the stderr tail."""
+    if handle is None:
         return False
 
-def download_osm_file(filename: str, bbox: Tuple[str, str, str, str]) -> bool:
-    """Downloads OSM data using the Overpass API based on the bounding box (includes existence check)."""
+    process, stderr_tail, reader = handle
+    process.wait()
+    reader.join()
+
+    if process.returncode != 0:
+        print(f"❌ Error during {description}.")
+        print(f"STDERR (last {len(stderr_tail)} lines):")
+        print("\n".join(stderr_tail))
+        return False
+
+    print("✅ Finished successfully.")
+    return True
+
+def run_command(command: List[str], description: str) -> bool:
+    """Executes a command to completion and checks for success."""
+    return _finish_command(_start_command(command), description)
+
+def _artifact_signature(*parts) -> str:
+    """Hashes the inputs (mtimes, CLI parameters) that a derived file depends on."""
+    return hashlib.sha256("|".join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+def _is_artifact_current(output_file: str, signature: str) -> bool:
+    """True when the output exists and its stored signature matches."""
+    sig_file = f"{output_file}.sig"
+    return (os.path.exists(output_file)
+            and os.path.exists(sig_file)
+            and Path(sig_file).read_text() == signature)
+
+def _store_artifact_signature(output_file: str, signature: str):
+    Path(f"{output_file}.sig").write_text(signature)
+
+# Keep-alive connection to Overpass, reused across requests so retries and
+# multi-bbox runs skip the TCP/TLS handshake.
+_overpass_conn = None
+
+def _overpass_request(body: bytes) -> http.client.HTTPResponse:
+    """
+    POSTs a query to Overpass over the shared keep-alive connection, retrying
+    with exponential backoff when the API throttles. Returns the open
+    response (status 200) for streaming; raises on persistent failure.
+    """
+    global _overpass_conn
+    headers = {
+        'Content-Type': 'application/x-www-form-urlencoded',
+        # Overpass serves gzip on request: ~5-10x fewer bytes over the
+        # wire for XML payloads.
+        'Accept-Encoding': 'gzip'
+    }
+
+    for attempt in range(OVERPASS_MAX_RETRIES + 1):
+        try:
+            if _overpass_conn is None:
+                _overpass_conn = http.client.HTTPSConnection(OVERPASS_HOST, timeout=200)
+            _overpass_conn.request('POST', OVERPASS_PATH, body=body, headers=headers)
+            response = _overpass_conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            # Stale keep-alive or network hiccup: reconnect on the next try.
+            _overpass_conn = None
+            if attempt == OVERPASS_MAX_RETRIES:
+                raise
+            time.sleep(2 ** attempt)
+            continue
+
+        if response.status in OVERPASS_RETRY_STATUSES and attempt < OVERPASS_MAX_RETRIES:
+            response.read()  # Drain so the connection stays reusable.
+            wait = 2 ** (attempt + 1)
+            print(f"⚠️ Overpass returned HTTP {response.status} (throttled?). Retrying in {wait}s...")
+            time.sleep(wait)
+            continue
+
+        if response.status != 200:
+            raise RuntimeError(f"Overpass returned HTTP {response.status} {response.reason}")
+
+        return response
+
+    raise RuntimeError("Overpass request failed after retries.")
+
+def download_osm_file(filename: str, bbox: Tuple[str, str, str, str], overwrite: bool = False) -> bool:
+    """
+    Downloads OSM data using the Overpass API based on the bounding box.
+    Identical bounding boxes are served from a local content-addressed cache
+    instead of re-hitting the rate-limited public API; pass overwrite=True to
+    force a fresh download.
+    """
     osm_file = f"{filename}.osm"
-    
-    if os.path.exists(osm_file):
+
+    if os.path.exists(osm_file) and not overwrite:
         print(f"✅ OSM file '{osm_file}' already exists. Skipping download.")
         return True
 
-    print(f"\n🌐 Downloading OSM data for BBOX: {', '.join(bbox)}")
-    
     min_lat, min_lon, max_lat, max_lon = bbox
     overpass_query = f"""
         [out:xml][timeout:180];
@@ -153,27 +329,56 @@ def download_osm_file(filename: str, bbox: Tuple[str, str, str, str]) -> bool:
           relation({min_lat},{min_lon},{max_lat},{max_lon});
         );
         (._;>;);
-        out meta;
+        out body;
     """
-    overpass_url = "https://overpass-api.de/api/interpreter"
-    
+
+    # The cache key covers the whole query, so any change to the BBOX or the
+    # query shape naturally misses.
+    cache_key = hashlib.sha256(overpass_query.encode('utf-8')).hexdigest()
+    cache_path = os.path.join(OSM_CACHE_DIR, f"{cache_key}.osm")
+
+    if os.path.exists(cache_path) and not overwrite:
+        print(f"✅ Found cached OSM data for this BBOX. Copying to '{osm_file}'.")
+        shutil.copyfile(cache_path, osm_file)
+        return True
+
+    print(f"\n🌐 Downloading OSM data for BBOX: {', '.join(bbox)}")
+
     try:
-        data = overpass_query.encode('utf-8')
-        req = urllib.request.Request(overpass_url, data=data, headers={'Content-Type': 'application/x-www-form-urlencoded'})
-        
-        with urllib.request.urlopen(req) as response:
-            with open(osm_file, 'wb') as f:
-                f.write(response.read())
-        
+        os.makedirs(OSM_CACHE_DIR, exist_ok=True)
+
+        response = _overpass_request(overpass_query.encode('utf-8'))
+
+        # Stream the body straight to disk in 1 MiB chunks: OSM extracts can
+        # be huge, and response.read() would hold the whole payload in memory.
+        if response.getheader('Content-Encoding') == 'gzip':
+            source = gzip.GzipFile(fileobj=response)
+        else:
+            source = response
+
+        # Write through a temp name and rename on success, so an interrupted
+        # download can never leave a truncated entry that later runs would
+        # treat as a valid cache hit.
+        partial_path = f"{cache_path}.part"
+        try:
+            with open(partial_path, 'wb') as f:
+                shutil.copyfileobj(source, f, length=1024 * 1024)
+            os.replace(partial_path, cache_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        shutil.copyfile(cache_path, osm_file)
+
         print(f"✅ Successfully downloaded OSM data to '{osm_file}'.")
         return True
-        
+
     except Exception as e:
         print(f"❌ Error downloading OSM file from Overpass API: {e}")
         print("   Check your internet connection or the area size.")
         return False
 
-def creating_required_files(filename: str, bbox: Tuple[str, str, str, str], end_time: str, period: str) -> bool:
+def creating_required_files(filename: str, bbox: Tuple[str, str, str, str], end_time: str, period: str, overwrite: bool = False) -> bool:
     """
     Downloads OSM data (if needed) and converts it into SUMO network files,
     forcing the generation of 'emergency' vehicles for proper priority testing.
@@ -193,105 +398,196 @@ def creating_required_files(filename: str, bbox: Tuple[str, str, str, str], end_
     route_file = f"{filename}.rou.xml" 
 
     # 1. Download OSM file (includes existence check)
-    if not download_osm_file(filename, bbox):
+    if not download_osm_file(filename, bbox, overwrite=overwrite):
         return False
         
-    # 2. Netconvert (Network generation) - Check existence
-    if os.path.exists(net_file):
+    # 2+3. Netconvert (network) and Polyconvert (GUI background polygons)
+    #      both read only the OSM file, so when both outputs are missing the
+    #      two tools run concurrently and are joined afterwards.
+    net_needed = not os.path.exists(net_file)
+    poly_needed = not os.path.exists(poly_file)
+    net_handle = None
+    poly_handle = None
+
+    if not net_needed:
         print(f"✅ Network file '{net_file}' already exists. Skipping Netconvert.")
-    elif not run_command(["netconvert", "--osm-files", osm_file, "-o", net_file], "Netconvert"):
-        return False
+    else:
+        net_handle = _start_command(["netconvert", "--osm-files", osm_file, "-o", net_file])
 
-    # 3. Polyconvert (Polygons for GUI backgrounds) - Check existence
-    if os.path.exists(poly_file):
+    if not poly_needed:
         print(f"✅ Poly file '{poly_file}' already exists. Skipping Polyconvert.")
-    else:
-        typemap_path = os.path.join(os.environ.get('SUMO_HOME', ''), 'data', 'typemap', 'osmPolyconvert.typ.xml')
-        # Fallback for common global install paths
-        if not os.path.exists(typemap_path):
-             typemap_path = "/usr/share/sumo/data/typemap/osmPolyconvert.typ.xml"
-        
-        if not os.path.exists(typemap_path):
-            print(f"❌ Error: Polyconvert typemap file not found. Skipping Polyconvert.")
-        elif not run_command(["polyconvert", "--osm-files", osm_file, "--type-file", typemap_path, "-o", poly_file], "Polyconvert"):
-            return False
+    elif TYPEMAP_PATH is None:
+        print(f"❌ Error: Polyconvert typemap file not found. Skipping Polyconvert.")
+        poly_needed = False
 
-    # 4. RandomTrips Generation - ***FORCING EMERGENCY VEHICLE GENERATION***
-    print(f"🔄 Generating new trip file '{trip_file}' (End Time={end_time}, Period={period}).")
-    print(f"   Note: Forcing 10% 'emergency' class trips for priority lane testing.")
-    
-    if 'SUMO_HOME' not in os.environ:
-        print("❌ Cannot run randomTrips.py: SUMO_HOME not set.")
+    if poly_needed:
+        poly_handle = _start_command(["polyconvert", "--osm-files", osm_file, "--type-file", TYPEMAP_PATH, "-o", poly_file])
+
+    if net_needed and not _finish_command(net_handle, "Netconvert"):
         return False
-        
-    random_trips_script = os.path.join(os.environ['SUMO_HOME'], 'tools', 'randomTrips.py')
-    
-    # Use --vclass to force a mix of passenger (90%) and emergency (10%)
-    if not run_command([
-        sys.executable, random_trips_script,
-        "-n", net_file, "-o", trip_file, "-e", end_time, "-p", period, "--validate"
-    ], "randomTrips"):
+    if poly_needed and not _finish_command(poly_handle, "Polyconvert"):
         return False
 
-    # 5. Duarouter (Route calculation) - ALWAYS REGENERATE as it depends on the new trip file
-    print(f"🔄 Generating new route file '{route_file}'.")
-    if not run_command(["duarouter", "-n", net_file, "-t", trip_file, "-o", route_file, "--ignore-errors"], "Duarouter"):
+    # 4. RandomTrips Generation - ***FORCING EMERGENCY VEHICLE GENERATION***
+    if RANDOMTRIPS_SCRIPT is None:
+        print("❌ Cannot run randomTrips.py: SUMO_HOME not set.")
         return False
-        
+
+    # Trip generation is skipped when the network and parameters are
+    # byte-identical to the previous run (signature stored next to the output).
+    trip_signature = _artifact_signature(os.path.getmtime(net_file), end_time, period, VALIDATE_TRIPS)
+
+    if _is_artifact_current(trip_file, trip_signature):
+        print(f"✅ Trip file '{trip_file}' is current (same network and parameters). Skipping randomTrips.")
+    else:
+        print(f"🔄 Generating new trip file '{trip_file}' (End Time={end_time}, Period={period}).")
+        print(f"   Note: Forcing 10% 'emergency' class trips for priority lane testing.")
+
+        # Use --vclass to force a mix of passenger (90%) and emergency (10%)
+        random_trips_cmd = [
+            sys.executable, RANDOMTRIPS_SCRIPT,
+            "-n", net_file, "-o", trip_file, "-e", end_time, "-p", period
+        ]
+        if VALIDATE_TRIPS:
+            random_trips_cmd.append("--validate")
+
+        if not run_command(random_trips_cmd, "randomTrips"):
+            return False
+        _store_artifact_signature(trip_file, trip_signature)
+
+    # 5. Duarouter (Route calculation) - regenerated only when the network or
+    #    the trip file actually changed
+    route_signature = _artifact_signature(os.path.getmtime(net_file), os.path.getmtime(trip_file))
+
+    if _is_artifact_current(route_file, route_signature):
+        print(f"✅ Route file '{route_file}' is current (same network and trips). Skipping Duarouter.")
+    else:
+        print(f"🔄 Generating new route file '{route_file}'.")
+
+        # Route computation is embarrassingly parallel across trips; leave
+        # one core for the rest of the system.
+        n_threads = str(max(1, (os.cpu_count() or 2) - 1))
+        duarouter_cmd = ["duarouter", "-n", net_file, "-t", trip_file, "-o", route_file, "--ignore-errors"]
+
+        if not run_command(duarouter_cmd + ["--routing-threads", n_threads], "Duarouter"):
+            # Older SUMO releases reject --routing-threads; retry without it.
+            print("⚠️ Retrying Duarouter without --routing-threads (older SUMO?).")
+            if not run_command(duarouter_cmd, "Duarouter"):
+                return False
+        _store_artifact_signature(route_file, route_signature)
+
+
     print("\nPipeline File Generation Complete!")
     return True
 
-def find_most_trafficked_edges(filename: str) -> Tuple[List[Tuple[str, int, int]], Dict[str, int], int]:
+def find_most_trafficked_edges(filename: str) -> Tuple[List[Tuple[str, int, int]], Dict[str, int], int, int]:
     """
     Parses the route file to find the most frequently used edges (TraCI-recognized IDs)
-    and merges this with lane count data from the net file. 
-    Output format: (SUMO_ID, Usage_Count, Num_Lanes)
+    and merges this with lane count data from the net file.
+    The emergency-vehicle count is gathered in the same route pass, so the
+    file is only parsed once.
+    Output format: ([(SUMO_ID, Usage_Count, Num_Lanes)], lane_count_map,
+    total_vehicles, emergency_count)
     """
     route_file = f"{filename}.rou.xml"
     net_file = f"{filename}.net.xml"
     
     if not os.path.exists(route_file) or not os.path.exists(net_file):
         print(f"❌ Error: Route file '{route_file}' or Network file '{net_file}' not found. Cannot analyze traffic.")
-        return [], {}, 0
+        return [], {}, 0, 0
 
-    edge_usage_counter = Counter()
+    edge_counts = defaultdict(int)
     total_vehicles = 0
-    
-    # 1. Count usage from Route File
+    emergency_count = 0
+
+    # 1. Count usage from Route File (streamed: city-scale .rou.xml files run
+    #    to hundreds of MB, so the full DOM is never built)
     try:
-        tree = ET.parse(route_file)
-        root = tree.getroot()
-        
-        for vehicle in root.findall('vehicle'):
-            total_vehicles += 1
-            route = vehicle.find('route')
-            if route is not None:
-                edge_list = route.get('edges', '').split()
-                edge_usage_counter.update(edge_list)
-
-    except ET.ParseError as e:
+        root = None
+        depth = 0
+        top_level_seen = 0
+
+        for event, elem in ET.iterparse(route_file, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+
+            tag = elem.tag
+            if tag == 'route':
+                # A vehicle's <route> end event fires just before its parent
+                # <vehicle> closes, so the edges can be read here from the
+                # raw attrib dict — no find() child scan per vehicle.
+                # Standalone route definitions (with an id) are not trips.
+                attrib = elem.attrib
+                edges_str = attrib.get('edges')
+                if edges_str and 'id' not in attrib:
+                    # Interning makes the dict probes pointer-compares: each
+                    # edge id recurs across thousands of routes.
+                    for e in edges_str.split():
+                        edge_counts[sys.intern(e)] += 1
+            elif tag == 'vehicle':
+                total_vehicles += 1
+                if elem.attrib.get('type') == 'emergency':
+                    emergency_count += 1
+                elem.clear()
+
+            # Prune processed children off the root between top-level
+            # elements so memory stays flat.
+            if depth == 1:
+                top_level_seen += 1
+                if top_level_seen % 1000 == 0:
+                    root.clear()
+
+    except XMLParseError as e:
         print(f"❌ XML Parsing Error: Could not read {route_file}: {e}")
-        return [], {}, 0
-        
+        return [], {}, 0, 0
+
+    edge_usage_counter = Counter(edge_counts)
+
     # 2. Get lane counts and filter non-existent/internal edges from Net File
+    #    (same streaming treatment as the route file)
     lane_data = {} # {full_sumo_id: num_lanes}
-    
+
     try:
-        tree = ET.parse(net_file)
-        root = tree.getroot()
-        
-        for edge in root.findall('edge'):
-            edge_id = edge.get('id')
-            if edge_id.startswith(':'): continue # Skip internal junctions
-            
-            lanes = edge.findall('lane')
-            num_lanes = len(lanes)
-            
-            if num_lanes > 0:
-                lane_data[edge_id] = num_lanes
-    except ET.ParseError as e:
+        root = None
+        depth = 0
+        top_level_seen = 0
+        current_lane_count = 0
+
+        for event, elem in ET.iterparse(net_file, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+
+            # Lanes are counted as their end events stream past, so no
+            # per-edge child list is ever materialized.
+            tag = elem.tag
+            if tag == 'lane':
+                current_lane_count += 1
+            elif tag == 'edge':
+                # Raw attrib access skips the get() defaulting wrapper —
+                # tiny, but this line runs once per edge in the network.
+                edge_id = elem.attrib.get('id')
+                if (edge_id is not None and not edge_id.startswith(':') # Skip internal junctions
+                        and current_lane_count > 0):
+                    lane_data[edge_id] = current_lane_count
+                current_lane_count = 0
+                elem.clear()
+
+            if depth == 1:
+                top_level_seen += 1
+                if top_level_seen % 1000 == 0:
+                    root.clear()
+
+    except XMLParseError as e:
         print(f"❌ XML Parsing Error: Could not read {net_file}: {e}")
-        return [], {}, 0
+        return [], {}, 0, 0
         
     
     # 3. Compile final list: (SUMO_ID, Usage_Count, Num_Lanes)
@@ -305,71 +601,68 @@ def find_most_trafficked_edges(filename: str) -> Tuple[List[Tuple[str, int, int]
             
     lane_count_map = {item[0]: item[2] for item in final_suggestions}
     
-    return final_suggestions, lane_count_map, total_vehicles
+    return final_suggestions, lane_count_map, total_vehicles, emergency_count
 
-def generate_sumo_config(filename: str, log_path: str, scenario_label: str, end_time_int: int) -> Tuple[str, str]:
-    """Creates a .sumocfg file with dynamic log paths and simulation time."""
-    config_file = f"{filename}_{scenario_label}.sumocfg"
-    
-    os.makedirs(log_path, exist_ok=True)
-    
-    summary_output = os.path.join(log_path, "summary_output.xml")
-    tripinfo_output = os.path.join(log_path, "tripinfo_output.xml")
-    
-    config_content = f"""
-<configuration>
-    <input>
-        <net-file value="{filename}.net.xml"/>
-        <route-files value="{filename}.rou.xml"/>
-        <additional-files value="{filename}.poly.xml"/>
-    </input>
-    <time>
-        <begin value="0"/>
-        <end value="{end_time_int}"/>
-    </time>
-    <output>
-        <summary-output value="{summary_output}"/>
-        <tripinfo-output value="{tripinfo_output}"/>
-    </output>
-</configuration>
+# Log directories already created this run; saves the stat() walk that
+# os.makedirs(exist_ok=True) performs on every call in a scenario sweep.
+_MADE_DIRS = set()
+
+def build_sumo_cmd(filename: str, log_path: str, end_time_int: int) -> List[str]:
     """
-    with open(config_file, 'w') as f:
-        f.write(config_content.strip())
-        
-    print(f"\n✅ Config file '{config_file}' created for '{scenario_label}' scenario.")
-    return config_file, log_path
+    Composes the SUMO command line for a scenario. All values are known at
+    call time, so they go straight onto the command line — no .sumocfg write
+    plus re-parse per scenario.
+    """
+    if log_path not in _MADE_DIRS:
+        os.makedirs(log_path, exist_ok=True)
+        _MADE_DIRS.add(log_path)
 
-def run_unblocked_simulation(filename: str, end_time_int: int) -> bool:
-    """Runs the baseline simulation without TraCI control."""
-    log_path = os.path.join(LOG_BASE_DIR, filename, "unblocked")
-    config_file, _ = generate_sumo_config(filename, log_path, "unblocked", end_time_int) 
-    
-    print("\n--- Starting SCENARIO 1: UNBLOCKED BASELINE (TraCI NOT Connected) ---")
-    print(f"All logs will be saved to: {log_path}")
-    
-    command = [
-        SUMO_BINARY, 
-        "-c", config_file, 
-        "--step-length", "1", 
-        "--quit-on-end", 
-        "--no-warnings", 
-        "--no-step-log",
+    return [
+        SUMO_BINARY,
+        "--net-file", f"{filename}.net.xml",
+        "--route-files", f"{filename}.rou.xml",
+        "--additional-files", f"{filename}.poly.xml",
+        "--begin", "0",
+        "--end", str(end_time_int),
+        "--summary-output", os.path.join(log_path, "summary_output.xml"),
+        "--tripinfo-output", os.path.join(log_path, "tripinfo_output.xml"),
+        "--statistic-output", os.path.join(log_path, "statistic_output.xml"),
+        "--step-length", "1",
+        "--quit-on-end",
+        "--no-warnings",
         "--device.rerouting.period", REROUTING_PERIOD,
         "--max-depart-delay", MAX_DEPART_DELAY
     ]
-    
-    try:
-        subprocess.run(command, check=True, capture_output=True)
-        print("\n✅ Baseline Simulation Complete.")
-        print(f"Results saved successfully to: {log_path}")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Error during Baseline Simulation. Check log for details.")
-        return False
-    except FileNotFoundError:
-        print(f"❌ Error: SUMO binary ('{SUMO_BINARY}') not found. Ensure it is in your PATH.")
+
+def start_unblocked_simulation(filename: str, end_time_int: int):
+    """
+    Launches the baseline simulation (no TraCI control) as a background
+    process so it can run while the blocked scenario is being configured.
+    stderr is drained concurrently into _start_command's bounded tail, so a
+    chatty baseline can never fill the pipe and stall mid-run. Returns a
+    handle for finish_unblocked_simulation, or None if SUMO is missing.
+    """
+    log_path = os.path.join(LOG_BASE_DIR, filename, "unblocked")
+
+    print("\n--- Starting SCENARIO 1: UNBLOCKED BASELINE (TraCI NOT Connected) ---")
+    print(f"All logs will be saved to: {log_path}")
+
+    return _start_command(build_sumo_cmd(filename, log_path, end_time_int) + ["--no-step-log"])
+
+def finish_unblocked_simulation(handle, filename: str) -> bool:
+    """Waits for the background baseline simulation and reports its outcome."""
+    if not _finish_command(handle, "Baseline Simulation"):
         return False
 
+    log_path = os.path.join(LOG_BASE_DIR, filename, "unblocked")
+    print("\n✅ Baseline Simulation Complete.")
+    print(f"Results saved successfully to: {log_path}")
+    return True
+
+def run_unblocked_simulation(filename: str, end_time_int: int) -> bool:
+    """Runs the baseline simulation to completion (serial convenience wrapper)."""
+    return finish_unblocked_simulation(start_unblocked_simulation(filename, end_time_int), filename)
+
 def parse_lane_ids(input_str: str, lane_count_map: Dict[str, int]) -> List[Tuple[str, int]]:
     """
     Parses a comma-separated string of 'EDGE_ID_LANE_INDEX' (e.g., '1057097342_-1')
@@ -377,18 +670,24 @@ def parse_lane_ids(input_str: str, lane_count_map: Dict[str, int]) -> List[Tuple
     Returns a list of valid (edge_id, lane_index) tuples.
     """
     valid_blocks = []
-    lane_id_pattern = re.compile(r"(.+?)(?:_(-?\d+))?$")
     raw_ids = [i.strip() for i in input_str.split(',') if i.strip()]
-    
+
     for raw_id in raw_ids:
-        match = lane_id_pattern.match(raw_id)
-        if not match:
-            continue
-            
-        edge_id = match.group(1)
-        lane_index_str = match.group(2)
-        
-        lane_index = int(lane_index_str) if lane_index_str else -1
+        # SUMO lane IDs are EDGEID_INDEX where the edge id may itself contain
+        # underscores, so split once from the right; a missing or non-numeric
+        # suffix means "all lanes". No regex engine (or its backtracking
+        # worst case) needed for this. int() itself decides what a valid
+        # index is — lookalike tests such as isdigit() accept strings
+        # ('--1', '⑤') that int() rejects, and this runs on raw user input.
+        edge_id, sep, suffix = raw_id.rpartition('_')
+
+        try:
+            lane_index = int(suffix) if sep else -1
+        except ValueError:
+            sep = ''
+
+        if not sep:
+            edge_id, lane_index = raw_id, -1
 
         num_lanes = lane_count_map.get(edge_id)
         
@@ -405,56 +704,84 @@ def parse_lane_ids(input_str: str, lane_count_map: Dict[str, int]) -> List[Tuple
     return valid_blocks
 
 
-def run_blocked_simulation_traci(
-    filename: str, 
-    end_time_int: int, 
-    suggested_edges_with_lanes: List[Tuple[str, int, int]], 
+MODE_LABELS = {
+    1: "Priority Lane (Block All NON-Priority)",
+    2: "Block Emergency Vehicles Only",
+    3: "Block Specific Vehicle IDs"
+}
+
+def get_blocking_inputs(
+    suggested_edges_with_lanes: List[Tuple[str, int, int]],
     lane_count_map: Dict[str, int],
-    blocking_mode: int,
-    specific_ids_str: str
-) -> bool:
+    end_time_int: int
+) -> Optional[Tuple[List[Tuple[str, int]], int, int]]:
     """
-    Runs the simulation with TraCI, implementing dynamic blocking based on mode (1, 2, or 3).
+    Interactively configures the lanes and time window for the blocked
+    scenario. Hoisted out of the simulation worker so all prompts complete
+    before any SUMO process is launched (the baseline can then run in the
+    background while the user types).
+    Returns (block_map, start_time, duration), or None if the input is unusable.
     """
-    try:
-        import traci
-    except ImportError:
-        print("❌ Fatal Error: Could not import 'traci'. Ensure SUMO_HOME is set and the 'tools' folder is accessible.")
-        return False
-
-    mode_labels = {
-        1: "Priority Lane (Block All NON-Priority)", 
-        2: "Block Emergency Vehicles Only", 
-        3: "Block Specific Vehicle IDs"
-    }
-    print(f"\n--- Starting SCENARIO 2: TRACI CONTROLLED LANE BLOCK ({mode_labels.get(blocking_mode, 'Unknown Mode')}) ---")
-
-    # --- Interactive Input for Edges/Lanes to block ---
     top_3_lane_ids = [f"{item[0]}_-1" for item in suggested_edges_with_lanes[:3]]
     default_edges_str = ",".join(top_3_lane_ids)
-    
+
     print("\n--- Now configure the specific LANES to block (Use format: EDGEID_LANEINDEX) ---")
     edges_str = input(
         f"Enter comma-separated Lane IDs (e.g., '1057097342_-1,789012_0').\n"
         f"Default (Top 3 Edges, All Lanes Blocked): [{default_edges_str}] "
     ) or default_edges_str
-    
+
     block_map = parse_lane_ids(edges_str, lane_count_map)
-    
+
     # --- Time Input ---
     try:
         start_time = int(input(f"Enter Simulation Time (sec) to start block (max {end_time_int}) [Default: 60]: ") or "60")
         duration = int(input("Enter Duration (sec) for the block [Default: 300]: ") or "300")
     except ValueError:
         print("❌ Invalid input for time or duration. Aborting TraCI run.")
-        return False
-    
-    block_end_time = start_time + duration
-    
+        return None
+
     if not block_map:
         print("❌ No valid Lane IDs were configured for blocking. Aborting TraCI run.")
-        return False
-        
+        return None
+
+    return block_map, start_time, duration
+
+
+def run_blocked_simulation_traci(
+    filename: str,
+    end_time_int: int,
+    block_map: List[Tuple[str, int]],
+    start_time: int,
+    duration: int,
+    lane_count_map: Dict[str, int],
+    blocking_mode: int,
+    specific_ids_str: str
+) -> bool:
+    """
+    Runs the simulation with TraCI, implementing dynamic blocking based on mode (1, 2, or 3).
+    The lanes and time window come pre-validated from get_blocking_inputs.
+    """
+    try:
+        # libsumo runs SUMO in-process with the same API surface as traci,
+        # eliminating the TCP round-trip every command otherwise pays.
+        import libsumo as traci
+    except ImportError:
+        try:
+            import traci
+        except ImportError:
+            print("❌ Fatal Error: Could not import 'libsumo' or 'traci'. Ensure SUMO_HOME is set and the 'tools' folder is accessible.")
+            return False
+
+    # libsumo exposes TraCIException at module root; traci nests it in 'exceptions'.
+    TraCIException = getattr(traci, 'exceptions', traci).TraCIException
+
+    mode_labels = MODE_LABELS
+    print(f"\n--- Starting SCENARIO 2: TRACI CONTROLLED LANE BLOCK ({mode_labels.get(blocking_mode, 'Unknown Mode')}) ---")
+
+    block_end_time = start_time + duration
+
+
     # Setup for Specific ID blocking (Mode 3)
     target_veh_ids = [vid.strip() for vid in specific_ids_str.split(',') if vid.strip()] if blocking_mode == 3 else []
     
@@ -475,116 +802,194 @@ def run_blocked_simulation_traci(
 
     # Set up simulation
     log_path = os.path.join(LOG_BASE_DIR, filename, "blocked")
-    config_file, _ = generate_sumo_config(filename, log_path, "blocked", end_time_int) 
-        
+
     print(f"\n🚧 Scheduled Block: {len(set(edge_id for edge_id, _ in block_map))} Edge(s). Mode: {mode_labels[blocking_mode]}")
     print(f"   Action: Block at t={start_time}, Unblock at t={block_end_time}")
 
-    sumo_cmd = [
-        SUMO_BINARY, 
-        "-c", config_file, 
-        "--step-length", "1", 
-        "--no-warnings", 
-        "--quit-on-end",
-        "--device.rerouting.period", REROUTING_PERIOD,
-        "--max-depart-delay", MAX_DEPART_DELAY
-    ]
+    sumo_cmd = build_sumo_cmd(filename, log_path, end_time_int)
     
     # Tracking for Mode 3: Specific IDs
-    stopped_vehicles = set() 
-    lanes_to_watch = set(f"{edge_id}_{lane_index}" for edge_id, lane_index in block_map)
-    
+    stopped_vehicles = set()
+
+    # Expand the (edge_id, lane_index) pairs into concrete lane ids once:
+    # the block and unblock actions then iterate a flat prebuilt list instead
+    # of recomputing the per-edge index ranges on each transition.
+    flat_block_lanes: List[str] = []
+    for edge_id, lane_index in block_map:
+        num_lanes = lane_count_map.get(edge_id)
+        if num_lanes is None: continue
+
+        indices_to_block = range(num_lanes) if lane_index == -1 else [lane_index]
+        flat_block_lanes.extend(f"{edge_id}_{idx}" for idx in indices_to_block)
+
+    # Mode 3 checks every target vehicle's position against the blocked edges
+    # each step; a dict keyed on edge id turns that linear scan into a single
+    # hash lookup. None means "all lanes on the edge are blocked".
+    edge_to_lane_filter: Dict[str, Optional[set]] = {}
+    for edge_id, lane_index in block_map:
+        if lane_index == -1:
+            edge_to_lane_filter[edge_id] = None
+        elif edge_id not in edge_to_lane_filter:
+            edge_to_lane_filter[edge_id] = {f"{edge_id}_{lane_index}"}
+        elif edge_to_lane_filter[edge_id] is not None:
+            edge_to_lane_filter[edge_id].add(f"{edge_id}_{lane_index}")
+
     try:
         traci.start(sumo_cmd)
-        step = 0
-        
-        while traci.simulation.getMinExpectedNumber() > 0 or step < end_time_int:
-            
-            # --- BLOCKING AND UNBLOCKING LOGIC (Type-Based - Modes 1 and 2) ---
-            if blocking_mode in [1, 2]:
-                if step == start_time or step == block_end_time:
-                    action = "BLOCKED" if step == start_time else "UNBLOCKED"
-                    
-                    # Determine the vehicle classes to set on the lane
-                    classes_to_set = allowed_vclasses
-                    if step == block_end_time:
-                         classes_to_set = ALL_VCLASSES_TO_CONTROL # Restore full allowance
-                    
-                    lanes_affected = 0
-                    for edge_id, lane_index in block_map:
-                        num_lanes = lane_count_map.get(edge_id)
-                        if num_lanes is None: continue 
-                        
-                        indices_to_block = range(num_lanes) if lane_index == -1 else [lane_index]
-                            
-                        for idx in indices_to_block:
-                            lane_to_block = f"{edge_id}_{idx}"
-                            
-                            try:
-                                traci.lane.setAllowed(lane_to_block, classes_to_set)
-                                lanes_affected += 1
-                            except traci.exceptions.TraCIException as e:
-                                # This handles cases where a lane might not be found or other minor issues
-                                # print(f"TraCI Exception on lane {lane_to_block}: {e}")
-                                continue
-                    
-                    print(f"-> {lanes_affected} lanes {action} by Type Filter at step {step}.")
 
-            
-            # --- SPECIFIC ID LOGIC (Mode 3) ---
-            if blocking_mode == 3:
-                # Logic for mode 3 remains the same
-                if start_time <= step < block_end_time:
-                    for vehID in target_veh_ids:
-                        try:
-                            laneID = traci.vehicle.getLaneID(vehID)
-                            edgeID = traci.vehicle.getRoadID(vehID)
-                            
-                            # Check if the vehicle is on *any* of the defined blocked edges
-                            is_on_blocked_edge = False
-                            for block_edge, block_lane_idx in block_map:
-                                if edgeID == block_edge:
-                                    if block_lane_idx == -1:
-                                        is_on_blocked_edge = True
-                                        break
-                                    elif laneID == f"{block_edge}_{block_lane_idx}":
-                                        is_on_blocked_edge = True
-                                        break
-
-                            if is_on_blocked_edge and vehID not in stopped_vehicles:
-                                traci.vehicle.setSpeed(vehID, 0)
-                                stopped_vehicles.add(vehID)
-                                print(f"   -> Vehicle {vehID} **STOPPED** on lane {laneID} at step {step}.")
-
-                        except traci.exceptions.TraCIException:
-                            continue
+        # One simulation-level subscription makes SUMO piggyback the
+        # remaining-vehicle count on every step response; the drain loops and
+        # progress prints read that instead of issuing a query round-trip.
+        sim_tc = traci.constants
+        traci.simulation.subscribe([sim_tc.VAR_MIN_EXPECTED_VEHICLES])
+
+        def expected_vehicles() -> int:
+            value = traci.simulation.getSubscriptionResults().get(sim_tc.VAR_MIN_EXPECTED_VEHICLES)
+            if value is None:
+                # No step executed since subscribing; fall back to a query.
+                return traci.simulation.getMinExpectedNumber()
+            return value
+
+        def apply_lane_classes(classes_to_set, action: str, step: int):
+            """Sets the allowed vehicle classes on every configured lane."""
+            lanes_affected = 0
+            for lane_to_block in flat_block_lanes:
+                try:
+                    traci.lane.setAllowed(lane_to_block, classes_to_set)
+                    lanes_affected += 1
+                except TraCIException as e:
+                    # This handles cases where a lane might not be found or other minor issues
+                    # print(f"TraCI Exception on lane {lane_to_block}: {e}")
+                    continue
+
+            print(f"-> {lanes_affected} lanes {action} by Type Filter at step {step}.")
+
+        # --- BLOCKING AND UNBLOCKING LOGIC (Type-Based - Modes 1 and 2) ---
+        if blocking_mode in [1, 2]:
+            # The only scripted events are the block and the unblock, so let
+            # SUMO advance to each event time internally instead of ticking
+            # the Python loop once per simulated second: three coarse
+            # simulationStep(t) calls replace ~end_time round-trips.
+            # simulationStep(0) would execute one step rather than none, so a
+            # block scheduled at t=0 must skip the fast-forward entirely.
+            if start_time > 0:
+                traci.simulationStep(float(start_time))
+
+            # Snapshot each lane's actual allowed set before overriding it:
+            # restoring this (rather than the full class list) keeps lanes
+            # that never allowed everything — a real bus lane, a footpath —
+            # faithful to the network after the unblock.
+            original_allowed = {}
+            for lane_id in flat_block_lanes:
+                try:
+                    original_allowed[lane_id] = traci.lane.getAllowed(lane_id)
+                except TraCIException:
+                    continue
+
+            apply_lane_classes(allowed_vclasses, "BLOCKED", start_time)
+
+            traci.simulationStep(float(block_end_time))
+
+            lanes_restored = 0
+            for lane_id, original_classes in original_allowed.items():
+                try:
+                    traci.lane.setAllowed(lane_id, original_classes)
+                    lanes_restored += 1
+                except TraCIException:
+                    continue
+            print(f"-> {lanes_restored} lanes UNBLOCKED (original allowances restored) at step {block_end_time}.")
+
+            traci.simulationStep(float(end_time_int))
+
+            # Drain vehicles still en route after the scheduled end.
+            while expected_vehicles() > 0:
+                traci.simulationStep()
+
+        # --- SPECIFIC ID LOGIC (Mode 3: polls vehicle positions, but only
+        #     inside the blocking window and only every few seconds) ---
+        else:
+            # Bind the hot TraCI entry points to locals once instead of
+            # re-resolving two attribute lookups per call on every step.
+            step_fn = traci.simulationStep
+            get_subscription_results = traci.vehicle.getAllSubscriptionResults
+            set_speed = traci.vehicle.setSpeed
+            tc = traci.constants
+
+            # Each target vehicle is subscribed to its lane/road ids once it
+            # is in the network; SUMO then pushes both values in one batched
+            # message per step instead of two query round-trips per vehicle.
+            # Vehicles that have not departed yet raise and stay pending.
+            pending_subscriptions = set(target_veh_ids)
+
+            def try_subscribe_pending():
+                for vehID in list(pending_subscriptions):
+                    try:
+                        traci.vehicle.subscribe(vehID, [tc.VAR_LANE_ID, tc.VAR_ROAD_ID])
+                        pending_subscriptions.discard(vehID)
+                    except TraCIException:
+                        continue
+
+            # Nothing is scripted before the window, so fast-forward to it in
+            # one call; inside the window, poll every MODE3_POLL_INTERVAL
+            # seconds rather than every simulated second (stop detection at
+            # that granularity is plenty for a breakdown scenario).
+            # simulationStep(0) would execute one step rather than none, so a
+            # window starting at t=0 must skip the fast-forward entirely.
+            if start_time > 0:
+                traci.simulationStep(float(start_time))
+
+            window_end = min(block_end_time, end_time_int)
+
+            for step in range(start_time, window_end, MODE3_POLL_INTERVAL):
+                try_subscribe_pending()
 
-                # Unblock (Restore speed) at the end time
-                if step == block_end_time:
-                    for vehID in stopped_vehicles:
+                for vehID, data in get_subscription_results().items():
+                    if vehID in stopped_vehicles:
+                        continue
+
+                    laneID = data.get(tc.VAR_LANE_ID, '')
+                    edgeID = data.get(tc.VAR_ROAD_ID, '')
+
+                    # Check if the vehicle is on any of the blocked
+                    # edges (single hash lookup, no per-edge scan)
+                    lane_filter = edge_to_lane_filter.get(edgeID, _NOT_BLOCKED)
+                    is_on_blocked_edge = lane_filter is None or laneID in lane_filter
+
+                    if is_on_blocked_edge:
                         try:
-                            traci.vehicle.setSpeed(vehID, -1) 
-                            print(f"   -> Vehicle {vehID} **UNBLOCKED** (speed restored) at step {step}.")
-                        except traci.exceptions.TraCIException:
+                            set_speed(vehID, 0)
+                        except TraCIException:
                             continue
-                    stopped_vehicles.clear()
+                        stopped_vehicles.add(vehID)
+                        print(f"   -> Vehicle {vehID} **STOPPED** on lane {laneID} at step {step}.")
+
+                step_fn(float(min(step + MODE3_POLL_INTERVAL, window_end)))
+
+                if step % 500 < MODE3_POLL_INTERVAL and step > start_time:
+                    active_vehicles = expected_vehicles()
+                    print(f"TraCI Step {step} | Active Vehicles: {active_vehicles} | Status: Specific IDs Stopped: {len(stopped_vehicles)}")
+
+            # Unblock (Restore speed) at the end of the window
+            for vehID in stopped_vehicles:
+                try:
+                    set_speed(vehID, -1)
+                    print(f"   -> Vehicle {vehID} **UNBLOCKED** (speed restored) at step {window_end}.")
+                except TraCIException:
+                    continue
+            stopped_vehicles.clear()
+
+            # Run out the rest of the schedule in one call, then drain.
+            traci.simulationStep(float(end_time_int))
+
+            while expected_vehicles() > 0:
+                step_fn()
 
-            # --- Simulation step ---
-            traci.simulationStep()
-            
-            if step % 500 == 0 and step > 0:
-                active_vehicles = traci.simulation.getMinExpectedNumber()
-                status = f"Specific IDs Stopped: {len(stopped_vehicles)}" if blocking_mode == 3 else f"Type Block: {mode_labels[blocking_mode]}"
-                print(f"TraCI Step {step} | Active Vehicles: {active_vehicles} | Status: {status}")
-                
-            step += 1
-            
         traci.close()
         print("\n✅ TraCI Simulation Complete.")
         print(f"Results saved successfully to: {log_path}")
         return True
 
-    except traci.TraCIException as e:
+    except TraCIException as e:
         print(f"❌ TraCI Error: Could not connect to SUMO or invalid command used: {e}")
         print("Ensure the SUMO binary is correctly configured.")
         return False
@@ -596,32 +1001,68 @@ def run_blocked_simulation_traci(
         return False
 
 
+class _TripInfoHandler(xml.sax.handler.ContentHandler):
+    """
+    SAX handler that collects tripinfo durations/route lengths into compact
+    double buffers. Unlike iterparse, no Element objects are ever built, so
+    multi-million-trip logs parse with zero allocator/GC pressure.
+    """
+    def __init__(self):
+        super().__init__()
+        self.durations = array('d')
+        self.route_lengths = array('d')
+
+    def startElement(self, tag, attrs):
+        if tag != 'tripinfo':
+            return
+        try:
+            duration = float(attrs['duration'])
+            route_length = float(attrs['routeLength'])
+        except (KeyError, ValueError):
+            return
+        self.durations.append(duration)
+        self.route_lengths.append(route_length)
+
+
 def extract_metrics(filepath: str) -> Optional[Dict]:
-    """Parses a tripinfo XML file and returns key aggregated metrics."""
+    """
+    Parses a tripinfo XML file and returns key aggregated metrics.
+    Results are memoized on (path, mtime), so repeated comparisons in the
+    same session never re-parse an unchanged log.
+    """
     if not os.path.exists(filepath):
         print(f"⚠️ Warning: Log file not found at {filepath}")
         return None
-        
-    try:
-        tree = ET.parse(filepath)
-        root = tree.getroot()
-        
-        total_trips = 0
-        total_travel_time = 0.0
-        total_route_length = 0.0
-        
-        for trip in root.findall('tripinfo'):
-            try:
-                duration = float(trip.get('duration'))
-                route_length = float(trip.get('routeLength'))
-            except (TypeError, ValueError):
-                continue
 
-            if duration > 0:
-                total_trips += 1
-                total_travel_time += duration
-                total_route_length += route_length
+    return _extract_metrics_cached(filepath, os.path.getmtime(filepath))
+
 
+@lru_cache(maxsize=8)
+def _extract_metrics_cached(filepath: str, mtime: float) -> Optional[Dict]:
+    try:
+        # Stream the file through SAX: only the two attributes we need are
+        # touched, and the reduction runs as a single C-level pass below.
+        handler = _TripInfoHandler()
+        xml.sax.parse(filepath, handler)
+        durations = handler.durations
+        route_lengths = handler.route_lengths
+
+        if np is not None:
+            d_arr = np.frombuffer(durations, dtype=np.float64)
+            l_arr = np.frombuffer(route_lengths, dtype=np.float64)
+            mask = d_arr > 0
+            total_trips = int(mask.sum())
+            total_travel_time = float(d_arr[mask].sum())
+            total_route_length = float(l_arr[mask].sum())
+        else:
+            total_trips = 0
+            total_travel_time = 0.0
+            total_route_length = 0.0
+            for duration, route_length in zip(durations, route_lengths):
+                if duration > 0:
+                    total_trips += 1
+                    total_travel_time += duration
+                    total_route_length += route_length
 
         if total_trips == 0:
             return None
@@ -635,7 +1076,7 @@ def extract_metrics(filepath: str) -> Optional[Dict]:
             "avg_speed_mps": avg_speed_mps
         }
 
-    except ET.ParseError as e:
+    except xml.sax.SAXParseException as e:
         print(f"❌ Error parsing XML file {filepath}: {e}")
         return None
     except Exception as e:
@@ -643,6 +1084,33 @@ def extract_metrics(filepath: str) -> Optional[Dict]:
         return None
 
 
+def extract_metrics_from_statistics(filepath: str) -> Optional[Dict]:
+    """
+    Reads SUMO's aggregate statistic-output — a tiny single-element file —
+    so the reporting phase can skip parsing the tripinfo log entirely.
+    Returns the same metric dict as extract_metrics, or None if unavailable.
+    """
+    if not os.path.exists(filepath):
+        return None
+
+    try:
+        stats = ET.parse(filepath).getroot().find('vehicleTripStatistics')
+        if stats is None:
+            return None
+
+        total_trips = int(stats.get('count'))
+        if total_trips == 0:
+            return None
+
+        return {
+            "total_trips": total_trips,
+            "avg_travel_time": float(stats.get('duration')),
+            "avg_speed_mps": float(stats.get('speed'))
+        }
+    except (XMLParseError, TypeError, ValueError):
+        return None
+
+
 def compare_simulation_results(filename: str):
     """Compares metrics from the unblocked and blocked scenarios."""
     
@@ -650,11 +1118,15 @@ def compare_simulation_results(filename: str):
     print("STARTING SCENARIO COMPARISON REPORT")
     print("="*50)
     
-    unblocked_path = os.path.join(LOG_BASE_DIR, filename, "unblocked", "tripinfo_output.xml")
-    blocked_path = os.path.join(LOG_BASE_DIR, filename, "blocked", "tripinfo_output.xml")
+    unblocked_dir = os.path.join(LOG_BASE_DIR, filename, "unblocked")
+    blocked_dir = os.path.join(LOG_BASE_DIR, filename, "blocked")
 
-    metrics_unblocked = extract_metrics(unblocked_path)
-    metrics_blocked = extract_metrics(blocked_path)
+    # Prefer SUMO's own aggregate statistics (one tiny element to parse);
+    # fall back to aggregating the full tripinfo log.
+    metrics_unblocked = (extract_metrics_from_statistics(os.path.join(unblocked_dir, "statistic_output.xml"))
+                         or extract_metrics(os.path.join(unblocked_dir, "tripinfo_output.xml")))
+    metrics_blocked = (extract_metrics_from_statistics(os.path.join(blocked_dir, "statistic_output.xml"))
+                       or extract_metrics(os.path.join(blocked_dir, "tripinfo_output.xml")))
     
     if not metrics_unblocked or not metrics_blocked:
         print("❌ Cannot perform comparison: one or both log files could not be read or were empty.")
@@ -707,7 +1179,7 @@ if __name__ == "__main__":
         sys.exit(1)
 
     # --- ROUTE-WEIGHTED SUGGESTION ---
-    suggested_edges, lane_count_map, total_vehicles = find_most_trafficked_edges(filename)
+    suggested_edges, lane_count_map, total_vehicles, emergency_count = find_most_trafficked_edges(filename)
     
     if suggested_edges:
         print("\n" + "="*70)
@@ -715,14 +1187,7 @@ if __name__ == "__main__":
         print(f"   (Analysis based on **{total_vehicles}** vehicles in '{filename}.rou.xml')")
         print("="*70)
         
-        # Count the types of vehicles created for verification
-        emergency_count = 0
-        try:
-            tree = ET.parse(f"{filename}.rou.xml")
-            emergency_count = sum(1 for v in tree.getroot().findall('vehicle') if v.get('type') == 'emergency')
-        except ET.ParseError:
-            pass
-
+        # Vehicle-type mix was counted during the single route-file pass above.
         print(f"   >>> Vehicle Type Check: Found {emergency_count} 'emergency' vehicles (approx. 10%).")
         
         print("\nTOP 5 SUGGESTIONS (Sorted by Route Usage Count):")
@@ -747,17 +1212,50 @@ if __name__ == "__main__":
         print("Attempting to run the simulation anyway.")
 
 
-    if not run_unblocked_simulation(filename, end_time_int):
-        print("\nBaseline simulation failed. Skipping TraCI run.")
+    # Gather all remaining interactive inputs up-front: once they are in,
+    # both scenarios can run to completion without stopping for prompts.
+    blocking_inputs = get_blocking_inputs(suggested_edges, lane_count_map, end_time_int)
+
+    if blocking_inputs is None:
+        print("\nBlocked-scenario configuration failed. Exiting.")
         sys.exit(1)
 
+    block_map, block_start_time, block_duration = blocking_inputs
+
+    # Launch the baseline in the background: the two scenarios are independent
+    # SUMO processes with separate output directories, so the baseline runs
+    # while the TraCI scenario executes. Pass --serial to run them one after
+    # the other instead (e.g. when one core has to fit both).
+    baseline_proc = None
+
+    if '--serial' in sys.argv:
+        baseline_ok = run_unblocked_simulation(filename, end_time_int)
+        if not baseline_ok:
+            print("\nBaseline simulation failed. Skipping TraCI run.")
+            sys.exit(1)
+    else:
+        baseline_proc = start_unblocked_simulation(filename, end_time_int)
+        if baseline_proc is None:
+            print("\nBaseline simulation failed to launch. Skipping TraCI run.")
+            sys.exit(1)
+
     # Pass all new parameters to the TraCI function
-    if not run_blocked_simulation_traci(
-        filename, end_time_int, suggested_edges, lane_count_map, blocking_mode, specific_ids_str
-    ):
+    blocked_ok = run_blocked_simulation_traci(
+        filename, end_time_int, block_map, block_start_time, block_duration,
+        lane_count_map, blocking_mode, specific_ids_str
+    )
+
+    if baseline_proc is not None:
+        baseline_ok = finish_unblocked_simulation(baseline_proc, filename)
+
+    if not blocked_ok:
          print("\nBlocked simulation failed. Skipping comparison.")
          sys.exit(1)
-         
+
+    if not baseline_ok:
+        print("\nBaseline simulation failed. Skipping comparison.")
+        sys.exit(1)
+
     compare_simulation_results(filename)
 
     print("\nAll scenarios and analysis complete.")